@@ -0,0 +1,108 @@
+"""Loads the PackageControl plugin outside of Keypirinha and gives it a throwaway profile to work in
+"""
+import datetime
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import types
+# the launcher has urllib.request loaded already, the plugin relies on that
+import urllib.request  # noqa: F401
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+sys.path.insert(0, os.path.join(BENCH_DIR, "stubs"))
+import keypirinha as kp  # noqa: E402
+
+
+def load_plugin_module():
+    """Imports packagecontrol.py as a submodule of a "PackageControl" package, like the launcher does
+    """
+    if "PackageControl" not in sys.modules:
+        package = types.ModuleType("PackageControl")
+        package.__path__ = [REPO_ROOT]
+        sys.modules["PackageControl"] = package
+    return importlib.import_module("PackageControl.packagecontrol")
+
+
+class Sandbox:
+    """Temporary Keypirinha profile (installed packages, user config and cache directory)
+    """
+    def __init__(self, server, installed=0, untracked=0, autoupdate=True, debug=False):
+        self.server = server
+        self.root = tempfile.mkdtemp(prefix="packagecontrol-bench-")
+        self.installed_dir = os.path.join(self.root, "InstalledPackages")
+        self.config_dir = os.path.join(self.root, "User")
+        self.cache_dir = os.path.join(self.root, "Packages")
+        for directory in (self.installed_dir, self.config_dir, self.cache_dir):
+            os.makedirs(directory)
+        kp.configure(self.installed_dir, self.config_dir, self.cache_dir)
+
+        installed = min(installed, len(server.packages))
+        untracked = min(untracked, len(server.packages) - installed)
+        self.installed = server.packages[:installed]
+        self.untracked = server.packages[installed:installed + untracked]
+        self.autoupdate = autoupdate
+        self.debug = debug
+        self.module = load_plugin_module()
+        self.reset()
+
+    def reset(self, outdated=0):
+        """Restores config and package files, the first `outdated` installed packages get an old mtime
+        """
+        with open(os.path.join(self.config_dir, "PackageControl.ini"), "w") as ini_file:
+            ini_file.write("[main]\n")
+            ini_file.write("debug = {}\n".format("yes" if self.debug else "no"))
+            ini_file.write("repository = {}\n".format(self.server.repo_url))
+            ini_file.write("alternative_repository = {}\n".format(self.server.alt_repo_url))
+            ini_file.write("autoupdate = {}\n".format("yes" if self.autoupdate else "no"))
+            ini_file.write("installed_packages =\n")
+            for package in self.installed:
+                ini_file.write("    {}\n".format(package["name"]))
+
+        for file in os.listdir(self.installed_dir):
+            os.remove(os.path.join(self.installed_dir, file))
+        for i, package in enumerate(self.installed + self.untracked):
+            self._write_package_file(package, outdated=i < outdated)
+        with open(os.path.join(self.installed_dir, "NotInRepository.keypirinha-package"), "wb") as file:
+            file.write(b"untracked")
+
+    def _write_package_file(self, package, outdated=False):
+        path = os.path.join(self.installed_dir, package["filename"])
+        with open(path, "wb") as file:
+            file.write(b"installed")
+        timestamp = datetime.datetime.strptime(package["date"], "%Y-%m-%dT%H:%M:%S%z").timestamp()
+        if outdated:
+            timestamp -= 86400
+        os.utime(path, times=(timestamp, timestamp))
+
+    def clear_file_cache(self):
+        shutil.rmtree(os.path.join(self.cache_dir, "PackageControl"), ignore_errors=True)
+
+    def new_plugin(self):
+        return self.module.PackageControl()
+
+    def started_plugin(self):
+        """Returns a plugin that went through on_start() and on_catalog(), so its caches are warm
+        """
+        plugin = self.new_plugin()
+        plugin.on_start()
+        plugin.on_catalog()
+        return plugin
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def catalog_item(plugin, target):
+    """Returns the catalog item of the plugin with the given command target
+    """
+    return next(item for item in plugin.catalog if item.target() == target)
+
+
+def errors(plugin):
+    """Returns the error messages the plugin logged
+    """
+    return [message for level, message in plugin.messages if level == "error"]
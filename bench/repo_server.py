@@ -0,0 +1,133 @@
+"""Local HTTP package repository that serves synthetic feeds
+
+The feed is served at /packages.json (and /alt/packages.json for the alternative repository), the
+package files at /files/<filename>. Every response can be delayed by a fixed latency and a fraction
+of the requests fail with a 503.
+"""
+import datetime
+import gzip
+import http.server
+import json
+import random
+import threading
+import time
+
+
+class RepositoryServer:
+    """Threaded HTTP server on localhost that serves a generated package repository
+    """
+    def __init__(self, package_count=100, latency=0.0, failure_rate=0.0, use_gzip=True, package_size=4096,
+                 seed=0):
+        self.package_count = package_count
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.use_gzip = use_gzip
+        self.package_size = package_size
+        self.failures_enabled = True
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+        self.base_url = "http://127.0.0.1:{}".format(self._httpd.server_address[1])
+        self.requests = 0
+        self.failures = 0
+        self.packages = self._generate_packages()
+        self._feed = json.dumps({"name": "Synthetic Repository", "packages": self.packages}).encode()
+        self._feed_gzip = gzip.compress(self._feed)
+        self._package_body = bytes(range(256)) * (package_size // 256) + bytes(package_size % 256)
+
+    @property
+    def repo_url(self):
+        return self.base_url + "/packages.json"
+
+    @property
+    def alt_repo_url(self):
+        return self.base_url + "/alt/packages.json"
+
+    def _generate_packages(self):
+        """Creates the package entries of the feed, dates are spread out over the last years
+        """
+        base_date = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        packages = []
+        for i in range(self.package_count):
+            name = "Keypirinha-Synthetic{:05d}".format(i)
+            filename = "Synthetic{:05d}.keypirinha-package".format(i)
+            packages.append({
+                "name": name,
+                "version": "1.{}.{}".format(i // 100, i % 100),
+                "description": "Synthetic package number {} used for benchmarking".format(i),
+                "date": (base_date + datetime.timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+                "download_url": "{}/files/{}".format(self.base_url, filename),
+                "filename": filename,
+                "owner": "owner{}".format(i % 37),
+                "homepage": "https://example.com/{}".format(name),
+            })
+        return packages
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = 0
+            self.failures = 0
+
+    def _should_fail(self):
+        with self._lock:
+            self.requests += 1
+            fail = self.failures_enabled and self.failure_rate > 0 and self._random.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+            return fail
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._should_fail():
+                    self._send(503, b"synthetic failure", "text/plain")
+                    return
+
+                if self.path in ("/packages.json", "/alt/packages.json"):
+                    if server.use_gzip and "gzip" in self.headers.get("Accept-Encoding", ""):
+                        self._send(200, server._feed_gzip, "application/json", {"Content-Encoding": "gzip"})
+                    else:
+                        self._send(200, server._feed, "application/json")
+                elif self.path.startswith("/files/"):
+                    self._send(200, server._package_body, "application/octet-stream")
+                else:
+                    self._send(404, b"not found", "text/plain")
+
+            def _send(self, code, body, content_type, headers=None):
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
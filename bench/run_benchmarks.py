@@ -0,0 +1,510 @@
+"""Benchmarks the hot paths of PackageControl against a synthetic local repository
+
+Runs every case for each repository size, writes the timings as JSON and optionally compares them
+with a previous result file. Exits with 1 if a case got slower than allowed or none of its samples
+succeeded, so it can be used as a regression check before a release.
+
+Example:
+    python bench/run_benchmarks.py --packages 100,1000 --output results.json
+    python bench/run_benchmarks.py --packages 100,1000 --baseline results.json
+"""
+import argparse
+import datetime
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import Sandbox, catalog_item, errors  # noqa: E402
+from repo_server import RepositoryServer  # noqa: E402
+
+SCHEMA_VERSION = 2
+# settings that change what is measured, results are only comparable if these are the same
+WORKLOAD_CONFIG = ("installed", "untracked", "latency_ms", "failure_rate", "gzip", "package_size", "seed")
+
+
+class BenchmarkError(Exception):
+    """Raised when a benchmarked call did not do what it is supposed to do
+    """
+    pass
+
+
+class Case:
+    """A benchmark case
+
+    setup(sandbox) prepares and returns the state for a single sample, run(state) is the timed part and
+    check(state) validates the outcome afterwards. Cases that leave the state unchanged are repeatable,
+    their samples call run(state) as often as needed to take at least --min-sample-time.
+    """
+    def __init__(self, name, setup, run, check=None, repeatable=False):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.check = check
+        self.repeatable = repeatable
+
+
+def _expect(condition, message):
+    if not condition:
+        raise BenchmarkError(message)
+
+
+def _setup_fresh(sandbox):
+    sandbox.reset()
+    sandbox.clear_file_cache()
+    return sandbox.new_plugin()
+
+
+def _setup_started(sandbox):
+    sandbox.reset()
+    return sandbox.started_plugin()
+
+
+def _setup_memory_cleared(sandbox):
+    plugin = _setup_started(sandbox)
+    plugin._available_packages = []
+    return plugin
+
+
+def _check_available(plugin):
+    packages = plugin._available_packages
+    _expect(len(packages) == len(plugin.bench_server.packages),
+            "expected {} available packages, got {}".format(len(plugin.bench_server.packages), len(packages)))
+
+
+def _check_started(plugin):
+    _check_available(plugin)
+    _expect(len(plugin._installed_packages) == len(plugin.bench_sandbox.installed),
+            "installed packages do not match the config")
+    _check_untracked(plugin)
+
+
+def _check_untracked(plugin):
+    _expect(len(plugin._untracked_packages) == len(plugin.bench_sandbox.untracked) + 1,
+            "expected {} untracked packages, got {}".format(len(plugin.bench_sandbox.untracked) + 1,
+                                                             len(plugin._untracked_packages)))
+
+
+def _suggest_case(name, target, expected):
+    def setup(sandbox):
+        plugin = _setup_started(sandbox)
+        plugin.bench_item = catalog_item(plugin, target)
+        return plugin
+
+    def check(plugin):
+        count = expected(plugin.bench_sandbox)
+        _expect(len(plugin.suggestions) == count,
+                "expected {} suggestions, got {}".format(count, len(plugin.suggestions)))
+
+    return Case(name, setup, lambda plugin: plugin.on_suggest("", [plugin.bench_item]), check, repeatable=True)
+
+
+def _setup_update_all(sandbox):
+    plugin = _setup_started(sandbox)
+    sandbox.reset(outdated=max(1, len(sandbox.installed) // 2))
+    plugin.bench_item = catalog_item(plugin, plugin.COMMAND_UPDATE_ALL)
+    return plugin
+
+
+def _check_update_all(plugin):
+    outdated = [name for name in plugin._installed_packages
+                if plugin._package_out_of_date(plugin._get_package(name))]
+    _expect(not outdated, "packages still out of date after update all: {}".format(outdated))
+
+
+CASES = [
+    Case("on_start", _setup_fresh, lambda plugin: plugin.on_start(), _check_started),
+    Case("get_available_packages_cold", _setup_started,
+         lambda plugin: plugin._get_available_packages(True), _check_available),
+    Case("get_available_packages_file_cache", _setup_memory_cleared,
+         lambda plugin: plugin._get_available_packages(), _check_available),
+    Case("get_available_packages_warm", _setup_started,
+         lambda plugin: plugin._get_available_packages(), _check_available, repeatable=True),
+    Case("check_installed", _setup_started, lambda plugin: plugin._check_installed(), _check_untracked,
+         repeatable=True),
+    _suggest_case("on_suggest_install", "install",
+                  lambda sandbox: len(sandbox.server.packages) - len(sandbox.installed)),
+    _suggest_case("on_suggest_remove", "remove", lambda sandbox: len(sandbox.installed)),
+    _suggest_case("on_suggest_reinstall_untracked", "reinstall_untracked", lambda sandbox: len(sandbox.untracked)),
+    Case("command_update_all", _setup_update_all,
+         lambda plugin: plugin.on_execute(plugin.bench_item, None), _check_update_all),
+]
+
+
+def _prepare(case, sandbox, server):
+    """Sets up the state for a sample, the server does not fail requests until the timed part starts
+    """
+    server.failures_enabled = False
+    plugin = case.setup(sandbox)
+    plugin.bench_sandbox = sandbox
+    plugin.bench_server = server
+    plugin.messages = []
+    server.reset_stats()
+    return plugin
+
+
+def _time(case, plugin, number):
+    """Calls the case `number` times with the garbage collector disabled, like timeit does
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            case.run(plugin)
+        return time.perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _autorange(case, plugin, min_sample_time):
+    """Returns the number of calls needed for a sample to take at least `min_sample_time`
+
+    Uses the same 1, 2, 5, 10, 20, 50, ... sequence as timeit.Timer.autorange()
+    """
+    i = 1
+    while True:
+        for j in 1, 2, 5:
+            number = i * j
+            if _time(case, plugin, number) >= min_sample_time:
+                return number
+        i *= 10
+
+
+def _mad(timings):
+    """Median absolute deviation, a measure of the spread that is not thrown off by single outliers
+    """
+    median = statistics.median(timings)
+    return statistics.median(abs(timing - median) for timing in timings)
+
+
+def run_case(case, sandbox, server, repeat, strict, min_sample_time):
+    """Runs a case `repeat` times and returns the timings of the successful samples
+
+    The first sample (or the calibration of repeatable cases) is a warm-up and not part of the result.
+    In strict mode every error aborts the benchmark. Otherwise (with simulated failures) a sample only
+    failed if it raised or its outcome doesn't pass the check, samples that logged errors but recovered
+    (e.g. by trying the alternative repository) are kept and counted as recovered.
+    """
+    if case.repeatable:
+        number = _autorange(case, _prepare(case, sandbox, server), min_sample_time)
+    else:
+        number = 1
+        _time(case, _prepare(case, sandbox, server), number)
+
+    timings = []
+    requests = []
+    failures = 0
+    recovered = 0
+    for _ in range(repeat):
+        plugin = _prepare(case, sandbox, server)
+        server.failures_enabled = True
+
+        try:
+            elapsed = _time(case, plugin, number) / number
+            server.failures_enabled = False
+            if strict:
+                _expect(not errors(plugin), "{} logged errors: {}".format(case.name, errors(plugin)))
+            if case.check:
+                case.check(plugin)
+        except Exception:
+            if strict:
+                raise
+            failures += 1
+            continue
+        finally:
+            requests.append(server.requests / number)
+
+        if server.failures or errors(plugin):
+            recovered += 1
+        timings.append(elapsed)
+
+    return {
+        "name": case.name,
+        "number": number,
+        "samples": timings,
+        "http_requests": requests,
+        "failed_samples": failures,
+        "recovered_samples": recovered,
+    }
+
+
+def _result_id(case, package_count):
+    return "{}[packages={}]".format(case.name, package_count)
+
+
+def measure(args, only=None):
+    """Runs the selected cases for every repository size, `only` restricts the run to these result ids
+
+    Runs inside a worker process, see run().
+    """
+    cases = [case for case in CASES if not args.cases or case.name in args.cases]
+    strict = args.failure_rate == 0
+    measurements = []
+    for package_count in args.packages:
+        size_cases = [case for case in cases if only is None or _result_id(case, package_count) in only]
+        if not size_cases:
+            continue
+        server = RepositoryServer(package_count=package_count,
+                                  latency=args.latency_ms / 1000,
+                                  failure_rate=args.failure_rate,
+                                  use_gzip=not args.no_gzip,
+                                  package_size=args.package_size,
+                                  seed=args.seed)
+        with server:
+            sandbox = Sandbox(server, installed=args.installed, untracked=args.untracked)
+            try:
+                for case in size_cases:
+                    measurement = run_case(case, sandbox, server, args.repeat, strict, args.min_sample_time)
+                    measurement["packages"] = package_count
+                    measurement["installed"] = len(sandbox.installed)
+                    measurement["id"] = _result_id(case, package_count)
+                    measurements.append(measurement)
+            finally:
+                sandbox.cleanup()
+    return measurements
+
+
+def _summarize(measurements):
+    """Pools the samples of the measurements of one case from all worker processes into a result entry
+    """
+    first = measurements[0]
+    timings = [timing for measurement in measurements for timing in measurement["samples"]]
+    requests = [count for measurement in measurements for count in measurement["http_requests"]]
+    # failed samples are left out of the timings, a result without any successful sample is invalid
+    return {
+        "id": first["id"],
+        "name": first["name"],
+        "packages": first["packages"],
+        "installed": first["installed"],
+        "processes": len(measurements),
+        "repeat": sum(len(measurement["samples"]) + measurement["failed_samples"]
+                      for measurement in measurements),
+        "number": max(measurement["number"] for measurement in measurements),
+        "valid": bool(timings),
+        "min": min(timings) if timings else None,
+        "median": statistics.median(timings) if timings else None,
+        "mean": statistics.mean(timings) if timings else None,
+        "max": max(timings) if timings else None,
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "mad": _mad(timings) if timings else None,
+        "http_requests": statistics.mean(requests),
+        "failed_samples": sum(measurement["failed_samples"] for measurement in measurements),
+        "recovered_samples": sum(measurement["recovered_samples"] for measurement in measurements),
+        "samples": timings,
+    }
+
+
+def run(args, only=None, measurements=None):
+    """Measures the cases in --processes fresh worker processes and returns the measurements by result id
+
+    Timings differ between interpreter processes (memory layout, hash randomization), so every process
+    only contributes its samples, like pyperf does. New measurements are added to `measurements`.
+    """
+    if measurements is None:
+        measurements = {}
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        runs = [pool.apply(measure, (args, only)) for _ in range(args.processes)]
+
+    for process_measurements in zip(*runs):
+        case_measurements = measurements.setdefault(process_measurements[0]["id"], [])
+        case_measurements.extend(process_measurements)
+        result = _summarize(case_measurements)
+        if result["valid"]:
+            print("{:<55} median {:10.3f} ms  min {:10.3f} ms".format(result["id"],
+                                                                     result["median"] * 1000,
+                                                                     result["min"] * 1000),
+                  file=sys.stderr)
+        else:
+            print("{:<55} all samples failed".format(result["id"]), file=sys.stderr)
+    return measurements
+
+
+def build_report(args, measurements):
+    """Creates the report from the measurements of all cases
+    """
+    results = [_summarize(case_measurements) for case_measurements in measurements.values()]
+    return {
+        "schema": SCHEMA_VERSION,
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "config": config(args),
+        },
+        "results": results,
+    }
+
+
+def config(args):
+    """Returns the settings of the run as they are stored in the report
+    """
+    return {
+        "packages": args.packages,
+        "installed": args.installed,
+        "untracked": args.untracked,
+        "repeat": args.repeat,
+        "processes": args.processes,
+        "min_sample_time": args.min_sample_time,
+        "latency_ms": args.latency_ms,
+        "failure_rate": args.failure_rate,
+        "gzip": not args.no_gzip,
+        "package_size": args.package_size,
+        "seed": args.seed,
+    }
+
+
+def config_mismatch(args, baseline):
+    """Returns the workload settings that differ between this run and the baseline
+    """
+    run_config = config(args)
+    baseline_config = baseline["meta"]["config"]
+    return [(key, baseline_config.get(key), run_config.get(key)) for key in WORKLOAD_CONFIG
+            if baseline_config.get(key) != run_config.get(key)]
+
+
+def compare(report, baseline, metric, max_regression, noise_factor):
+    """Compares the report with a baseline report and returns the list of regressions
+
+    A case only counts as regressed if it is more than `max_regression` slower and the slowdown is
+    larger than `noise_factor` times the spread (median absolute deviation) of either run.
+    """
+    previous = {result["id"]: result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get(result["id"])
+        if old is None or not result["valid"] or not old["valid"]:
+            continue
+        ratio = result[metric] / old[metric] if old[metric] else float("inf")
+        result["baseline"] = old[metric]
+        result["ratio"] = ratio
+        noise = noise_factor * max(result["mad"], old["mad"])
+        if ratio > 1 + max_regression and result[metric] - old[metric] > noise:
+            regressions.append(result)
+    return regressions
+
+
+def confirm_regressions(args, measurements, baseline):
+    """Compares with the baseline and measures regressed cases again, up to --confirm times
+
+    Stalls of the machine slow down all samples of a case alike, so they can't be told apart from a
+    real slowdown within one measurement. Reruns use new worker processes and their samples are pooled
+    with the earlier ones, a regression only counts if the pooled samples still show it.
+
+    The pooled cases have samples of more processes than the baseline. With --metric min that favors
+    them, so slowdowns smaller than the spread between processes (see "mad") can go unnoticed. Use
+    --metric median and more --processes to catch those.
+
+    Returns the report and the regressed results.
+    """
+    report = build_report(args, measurements)
+    regressions = compare(report, baseline, args.metric, args.max_regression, args.noise_factor)
+    reruns = 0
+    while regressions and reruns < args.confirm:
+        reruns += 1
+        print("Measuring {} case(s) again to confirm the regression".format(len(regressions)), file=sys.stderr)
+        run(args, {result["id"] for result in regressions}, measurements)
+        report = build_report(args, measurements)
+        regressions = compare(report, baseline, args.metric, args.max_regression, args.noise_factor)
+    return report, regressions
+
+
+def _comma_separated_ints(value):
+    return [int(part) for part in value.split(",") if part]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--packages", type=_comma_separated_ints, default=[100, 1000],
+                        help="comma separated repository sizes (default: 100,1000)")
+    parser.add_argument("--installed", type=int, default=25, help="number of installed packages (default: 25)")
+    parser.add_argument("--untracked", type=int, default=5, help="number of untracked packages (default: 5)")
+    parser.add_argument("--repeat", type=int, default=10, help="samples per case and process (default: 10)")
+    parser.add_argument("--processes", type=int, default=3,
+                        help="number of worker processes the samples are spread over (default: 3)")
+    parser.add_argument("--min-sample-time", type=float, default=0.1,
+                        help="minimum duration in seconds of a sample of repeatable cases (default: 0.1)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="latency per HTTP request (default: 0)")
+    parser.add_argument("--failure-rate", type=float, default=0,
+                        help="fraction of failing HTTP requests, samples that don't recover are counted as failed "
+                             "instead of aborting the run (default: 0)")
+    parser.add_argument("--no-gzip", action="store_true", help="serve the package list uncompressed")
+    parser.add_argument("--package-size", type=int, default=4096, help="size of package files in bytes")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the failure simulation")
+    parser.add_argument("--cases", nargs="*", choices=[case.name for case in CASES], help="cases to run")
+    parser.add_argument("--output", default="-", help="file to write the JSON results to (default: stdout)")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--metric", choices=["min", "median", "mean"], default="min",
+                        help="timing compared against the baseline (default: min)")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="allowed slowdown relative to the baseline (default: 0.25)")
+    parser.add_argument("--noise-factor", type=float, default=3.0,
+                        help="slowdowns below this multiple of the spread of the timings are treated as noise "
+                             "(default: 3.0)")
+    parser.add_argument("--confirm", type=int, default=2,
+                        help="how often regressed cases are measured again before they count (default: 2)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, "r") as baseline_file:
+                baseline = json.load(baseline_file)
+        except (OSError, ValueError) as ex:
+            print("Baseline '{}' could not be read: {}".format(args.baseline, ex), file=sys.stderr)
+            return 2
+        if baseline.get("schema") != SCHEMA_VERSION:
+            print("Baseline was written with report schema {}, this version uses schema {}".format(
+                baseline.get("schema"), SCHEMA_VERSION), file=sys.stderr)
+            print("Refusing to compare, record the baseline again", file=sys.stderr)
+            return 2
+        mismatch = config_mismatch(args, baseline)
+        if mismatch:
+            for key, old, new in mismatch:
+                print("Baseline was recorded with {} = {}, this run uses {}".format(key, old, new), file=sys.stderr)
+            print("Refusing to compare results of different configurations", file=sys.stderr)
+            return 2
+
+    measurements = run(args)
+    report = build_report(args, measurements)
+
+    regressions = []
+    if baseline:
+        report, regressions = confirm_regressions(args, measurements, baseline)
+        report["regressions"] = [result["id"] for result in regressions]
+    invalid = [result for result in report["results"] if not result["valid"]]
+    report["invalid"] = [result["id"] for result in invalid]
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=4)
+        print()
+    else:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=4)
+
+    for result in regressions:
+        print("REGRESSION {}: {} {:.3f} ms -> {:.3f} ms ({:+.0%})".format(result["id"],
+                                                                         args.metric,
+                                                                         result["baseline"] * 1000,
+                                                                         result[args.metric] * 1000,
+                                                                         result["ratio"] - 1),
+              file=sys.stderr)
+    for result in invalid:
+        print("FAILED {}: none of the {} samples succeeded".format(result["id"], result["repeat"]), file=sys.stderr)
+    return 1 if regressions or invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
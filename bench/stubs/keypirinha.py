@@ -0,0 +1,234 @@
+"""Minimal stand-in for the keypirinha module that only exists inside the launcher
+
+Implements just enough of the plugin API for PackageControl to run outside of Keypirinha. The
+directories returned by installed_package_dir(), user_config_dir() and package_cache_dir() are
+configured through configure().
+"""
+import configparser
+import os
+
+_runtime = {
+    "installed_package_dir": None,
+    "user_config_dir": None,
+    "package_cache_dir": None,
+}
+
+
+def configure(installed_package_dir, user_config_dir, package_cache_dir):
+    """Sets the directories the stubbed runtime reports to plugins
+    """
+    _runtime["installed_package_dir"] = installed_package_dir
+    _runtime["user_config_dir"] = user_config_dir
+    _runtime["package_cache_dir"] = package_cache_dir
+
+
+def name():
+    return "Keypirinha"
+
+
+def version_string():
+    return "2.26"
+
+
+def installed_package_dir():
+    return _runtime["installed_package_dir"]
+
+
+def user_config_dir():
+    return _runtime["user_config_dir"]
+
+
+def package_cache_dir():
+    return _runtime["package_cache_dir"]
+
+
+class ItemCategory:
+    KEYWORD = 1
+    FILE = 2
+    URL = 4
+    USER_BASE = 1000
+
+
+class ItemArgsHint:
+    FORBIDDEN = 0
+    ACCEPTED = 1
+    REQUIRED = 2
+
+
+class ItemHitHint:
+    KEEPALL = 0
+    NOARGS = 1
+    IGNORE = 2
+
+
+class Events:
+    APPCONFIG = 0x1
+    PACKCONFIG = 0x2
+    NETOPTIONS = 0x4
+    DESKTOP = 0x8
+
+
+class Action:
+    """Action as created by Plugin.create_action()
+    """
+    def __init__(self, name, label, short_desc=""):
+        self._name = name
+        self._label = label
+        self._short_desc = short_desc
+
+    def name(self):
+        return self._name
+
+    def label(self):
+        return self._label
+
+    def short_desc(self):
+        return self._short_desc
+
+
+class CatalogItem:
+    """Item as created by Plugin.create_item()
+    """
+    def __init__(self, category, label, short_desc, target, args_hint, hit_hint, data_bag=None):
+        self._category = category
+        self._label = label
+        self._short_desc = short_desc
+        self._target = target
+        self._args_hint = args_hint
+        self._hit_hint = hit_hint
+        self._raw_args = ""
+        self._data_bag = data_bag
+
+    def category(self):
+        return self._category
+
+    def label(self):
+        return self._label
+
+    def short_desc(self):
+        return self._short_desc
+
+    def set_short_desc(self, short_desc):
+        self._short_desc = short_desc
+
+    def target(self):
+        return self._target
+
+    def raw_args(self):
+        return self._raw_args
+
+    def set_args(self, raw_args):
+        self._raw_args = raw_args
+
+    def data_bag(self):
+        return self._data_bag
+
+    def set_data_bag(self, data_bag):
+        self._data_bag = data_bag
+
+    def clone(self):
+        item = CatalogItem(self._category, self._label, self._short_desc, self._target, self._args_hint,
+                           self._hit_hint, self._data_bag)
+        item._raw_args = self._raw_args
+        return item
+
+    def __repr__(self):
+        return "<CatalogItem {!r} target={!r}>".format(self._label, self._target)
+
+
+class Settings:
+    """Read-only view of a package's ini file, mirrors the getters of keypirinha.Settings
+    """
+    def __init__(self, path):
+        self._config = configparser.ConfigParser()
+        self._config.read(path)
+
+    def get(self, key, section="main", fallback=None, unquote=False):
+        value = self._config.get(section, key, fallback=None)
+        if value is None:
+            return fallback
+        return value.strip("\"'") if unquote else value
+
+    def get_bool(self, key, section="main", fallback=None):
+        value = self.get(key, section)
+        if value is None:
+            return fallback
+        if value.lower() in ("1", "yes", "true", "on"):
+            return True
+        if value.lower() in ("0", "no", "false", "off"):
+            return False
+        return fallback
+
+    def get_float(self, key, section="main", fallback=None):
+        try:
+            return float(self.get(key, section))
+        except (TypeError, ValueError):
+            return fallback
+
+    def get_multiline(self, key, section="main", fallback=[], keep_empty_lines=False):
+        value = self.get(key, section)
+        if value is None:
+            return fallback
+        lines = [line.strip() for line in value.splitlines()]
+        return lines if keep_empty_lines else [line for line in lines if line]
+
+
+class Plugin:
+    """Base class of all plugins
+
+    Everything the launcher would display (catalog, suggestions, log messages) is kept in attributes
+    so callers can inspect it afterwards.
+    """
+    def __init__(self):
+        self._debug = False
+        self.catalog = []
+        self.suggestions = []
+        self.actions = {}
+        self.messages = []
+
+    def package_full_name(self):
+        return "PackageControl"
+
+    def get_package_cache_path(self, create=False):
+        path = os.path.join(package_cache_dir(), self.package_full_name())
+        if create:
+            os.makedirs(path, exist_ok=True)
+        return path
+
+    def load_settings(self):
+        return Settings(os.path.join(user_config_dir(), "{}.ini".format(self.package_full_name())))
+
+    def _log(self, level, *args):
+        self.messages.append((level, " ".join(str(arg) for arg in args)))
+
+    def dbg(self, *args, **kwargs):
+        if self._debug:
+            self._log("debug", *args)
+
+    def info(self, *args, **kwargs):
+        self._log("info", *args)
+
+    def warn(self, *args, **kwargs):
+        self._log("warning", *args)
+
+    def err(self, *args, **kwargs):
+        self._log("error", *args)
+
+    def create_action(self, name, label, short_desc=""):
+        return Action(name, label, short_desc)
+
+    def set_actions(self, category, actions):
+        self.actions[category] = list(actions)
+
+    def create_item(self, category, label, short_desc, target, args_hint, hit_hint, **kwargs):
+        return CatalogItem(category, label, short_desc, target, args_hint, hit_hint, kwargs.get("data_bag"))
+
+    def create_error_item(self, label, short_desc, target=""):
+        return CatalogItem(ItemCategory.KEYWORD, label, short_desc, target, ItemArgsHint.FORBIDDEN,
+                           ItemHitHint.IGNORE)
+
+    def set_catalog(self, catalog):
+        self.catalog = list(catalog)
+
+    def set_suggestions(self, suggestions, match_method=None, sort_method=None):
+        self.suggestions = list(suggestions)
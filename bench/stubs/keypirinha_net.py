@@ -0,0 +1,11 @@
+"""Minimal stand-in for the keypirinha_net module that only exists inside the launcher
+"""
+import urllib.request
+
+
+def build_urllib_opener(proxies=None, ssl_check=True, extra_handlers=[]):
+    """Builds an urllib opener, ignores the proxy settings of the environment unless given explicitly
+    """
+    handlers = [urllib.request.ProxyHandler(proxies if proxies is not None else {})]
+    handlers.extend(extra_handlers)
+    return urllib.request.build_opener(*handlers)
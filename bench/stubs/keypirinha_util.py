@@ -0,0 +1,12 @@
+"""Minimal stand-in for the keypirinha_util module that only exists inside the launcher
+"""
+
+executed = []
+
+
+def shell_execute(thing, args="", working_dir="", verb="", try_runas=True, detect_nongui=True,
+                  api_flags=None, terminal_cmd=None, show=-1):
+    """Records the call instead of launching anything
+    """
+    executed.append(thing)
+    return True
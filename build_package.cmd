@@ -43,6 +43,7 @@ echo Using "%SEVENZIP%" to pack
     -x!%~nx0 ^
     -xr!.git ^
     -xr!usage.gif ^
+    -xr!bench ^
     -xr@.gitignore ^
     -x!.gitignore ^
     *